@@ -1,18 +1,16 @@
 import streamlit as st
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import pandas as pd
+import numpy as np
 import time
-import altair as alt
-
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import letter
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.platypus import Image  # Add this to your import section if not there
+import asyncio
+import diskcache
+import hashlib
+import orjson
 
 import io
-import datetime
-import os
 
 
 st.set_page_config(page_title="Startup Scoring Tool", layout="centered")
@@ -36,11 +34,52 @@ single_domain = st.text_input(
     "Enter a company domain below to analyze and score it based on key attributes.",
     placeholder="e.g. stripe.com",
 )
+# Normalized like CSV domains so both paths share cache entries
+single_domain = single_domain.strip().lower()
 
 api_key = st.secrets["api"]["api_key"]
+rate_per_minute = st.secrets["api"].get("rate_per_minute", 25)
+
+
+# ---- HTTP Session ----
+RETRY_STATUSES = [429, 500, 502, 503, 504]  # Rate limits and transient errors
+
+
+@st.cache_resource
+def get_session():
+    session = requests.Session()
+    retries = Retry(
+        total=3,
+        backoff_factor=0.5,
+        status_forcelist=RETRY_STATUSES,
+        raise_on_status=False,  # Let the caller handle the final status code
+    )
+    session.mount(
+        "https://",
+        HTTPAdapter(pool_connections=20, pool_maxsize=20, max_retries=retries),
+    )
+    return session
+
+
+# ---- Response Cache ----
+CACHE_TTL = 7 * 86400  # Hunter.io data changes on the order of days
+
+
+@st.cache_resource
+def get_cache():
+    return diskcache.Cache(".hunter_cache")
+
+
+def cache_key(domain, api_key):
+    return (domain, hashlib.sha256(api_key.encode()).hexdigest())
 
 
 # ---- Scoring Function ----
+_INDUSTRY_SET = frozenset({"software", "technology", "saas"})
+_TYPE_SET = frozenset({"generic", "personal"})
+_POS_SET = frozenset({"ceo", "founder", "cto"})
+
+
 def score_startup(data):
     score = 0
     org = data.get("organization", data.get("domain", "N/A"))
@@ -51,23 +90,14 @@ def score_startup(data):
     # Score logic
     if email_count:
         score += min(30, email_count * 10)
-    if industry and industry.lower() in ["software", "technology", "saas"]:
+    if industry and industry.lower() in _INDUSTRY_SET:
         score += 10
     if employees and employees > 10:
         score += 20
     if data.get("webmail"):
         score += 10
 
-    for email in data.get("emails", []):
-        if email["type"] in ["generic", "personal"]:
-            if email.get("confidence", 0) >= 80:
-                score += 10
-            if email.get("position") and email["position"].lower() in [
-                "ceo",
-                "founder",
-                "cto",
-            ]:
-                score += 5
+    score += email_bonus(data.get("emails", []))
 
     return {
         "organization": org,
@@ -79,25 +109,306 @@ def score_startup(data):
     }
 
 
+def email_bonus(emails):
+    bonus = 0
+    for email in emails:
+        is_target = email.get("type") in _TYPE_SET
+        confidence = email.get("confidence", 0) or 0
+        position = (email.get("position") or "").lower()
+        bonus += 10 * (is_target and confidence >= 80)
+        bonus += 5 * (is_target and position in _POS_SET)
+    return bonus
+
+
+# Vectorized email_bonus: one row per email, summed back per response
+def email_bonuses(emails):
+    exploded = emails.explode().dropna()
+    flat = pd.json_normalize(exploded.tolist()).reindex(
+        columns=["type", "confidence", "position"]
+    )
+    flat.index = exploded.index
+
+    is_target = flat["type"].isin(_TYPE_SET)
+    confident = pd.to_numeric(flat["confidence"], errors="coerce").fillna(0) >= 80
+    senior = flat["position"].fillna("").astype(str).str.lower().isin(_POS_SET)
+
+    bonus = 10 * (is_target & confident) + 5 * (is_target & senior)
+    return bonus.groupby(level=0).sum().reindex(emails.index, fill_value=0)
+
+
+# Vectorized score_startup for a batch of Hunter.io responses
+SCORE_FIELDS = [
+    "organization",
+    "domain",
+    "industry",
+    "emails_count",
+    "employees",
+    "webmail",
+    "emails",
+]
+
+
+def score_batch(responses):
+    flat = pd.json_normalize(responses).reindex(columns=SCORE_FIELDS)
+    industry = flat["industry"].fillna("").astype(str)
+    email_count = flat["emails_count"].fillna(0)
+    employees = pd.to_numeric(flat["employees"], errors="coerce").fillna(0)
+
+    score = (
+        np.minimum(30, email_count * 10)
+        + np.where(industry.str.lower().isin(_INDUSTRY_SET), 10, 0)
+        + np.where(employees > 10, 20, 0)
+        + np.where(flat["webmail"].fillna(False).astype(bool), 10, 0)
+        + email_bonuses(flat["emails"])
+    )
+
+    return pd.DataFrame(
+        {
+            "organization": flat["organization"].fillna(flat["domain"]),
+            "domain": flat["domain"],
+            "industry": industry.replace("", "N/A"),
+            "emails_found": email_count.astype(int),
+            "employees": employees.astype(int).astype(object).where(
+                employees > 0, "N/A"
+            ),
+            "score": score.astype(int),
+        }
+    )
+
+
+# Low < 40 <= Mid < 75 <= High
+def classify_scores(scores):
+    return pd.cut(
+        scores,
+        bins=[-np.inf, 40, 75, np.inf],
+        labels=["Low", "Mid", "High"],
+        right=False,
+    )
+
+
+def empty_result(domain):
+    return {
+        "organization": "N/A",
+        "domain": domain,
+        "industry": "N/A",
+        "emails_found": 0,
+        "employees": "N/A",
+        "score": 0,
+    }
+
+
+# ---- Single Domain ----
+# Failed lookups raise, so st.cache_data only keeps successful scores
+@st.cache_data(ttl=CACHE_TTL, show_spinner=False)
+def score_domain(domain, api_key):
+    key = cache_key(domain, api_key)
+    data = get_cache().get(key)
+    if data is None:
+        url = f"https://api.hunter.io/v2/domain-search?domain={domain}&api_key={api_key}"
+        response = get_session().get(url, timeout=10)
+        response.raise_for_status()
+        data = orjson.loads(response.content).get("data", {})
+        get_cache().set(key, data, expire=CACHE_TTL)
+    return score_startup(data)
+
+
+# ---- Batch Fetching ----
+MAX_CONCURRENCY = 20  # Upper bound on in-flight Hunter.io requests
+RATE_LIMIT_THRESHOLD = 5  # Pause until reset below this many remaining calls
+MAX_RESET_WAIT = 60  # Longest pause, in seconds, for a single rate-limit reset
+
+
+# AsyncLimiter that also pauses when Hunter.io's X-RateLimit-* headers
+# report the quota is nearly used up. The rate itself stays at max_rate.
+class AdaptiveLimiter:
+    def __init__(self, max_rate, time_period=60):
+        from aiolimiter import AsyncLimiter  # Deferred with the batch-only deps
+
+        self.limiter = AsyncLimiter(max_rate, time_period)
+        self.resume_at = 0.0
+
+    async def __aenter__(self):
+        await self.wait_for_reset()
+        await self.limiter.acquire()
+        # Tasks already queued in acquire() must also honour a pause set meanwhile
+        await self.wait_for_reset()
+
+    async def wait_for_reset(self):
+        delay = self.resume_at - time.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def __aexit__(self, *exc_info):
+        return None
+
+    def update(self, headers):
+        try:
+            remaining = int(headers["X-RateLimit-Remaining"])
+            reset = float(headers["X-RateLimit-Reset"])
+        except (KeyError, ValueError):
+            return
+
+        if remaining < RATE_LIMIT_THRESHOLD:
+            # The reset header is either an epoch timestamp or seconds until reset
+            now = time.time()
+            delay = reset - now if reset > 1e9 else reset
+            delay = min(max(delay, 0), MAX_RESET_WAIT)
+            self.resume_at = max(self.resume_at, now + delay)
+
+
+# Wrapped with tenacity's retry in fetch_all
+async def get_domain_json(session, limiter, url):
+    async with limiter:
+        async with session.get(url) as response:
+            limiter.update(response.headers)
+            if response.status in RETRY_STATUSES:
+                response.raise_for_status()  # Back off and retry
+            if response.status == 200:
+                payload = orjson.loads(await response.read())
+                if isinstance(payload, dict):
+                    return payload.get("data")
+    return None
+
+
+async def fetch(session, sem, limiter, get_json, domain):
+    import aiohttp
+
+    url = f"https://api.hunter.io/v2/domain-search?domain={domain}&api_key={api_key}"
+    async with sem:
+        try:
+            return await get_json(session, limiter, url)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            # str(e) can include the request URL, which carries the API key
+            st.warning(
+                f"⚠️ Failed to fetch {domain} after retries ({type(e).__name__})."
+            )
+        except orjson.JSONDecodeError:
+            st.warning(f"⚠️ Invalid response for {domain}.")
+        except Exception as e:
+            # Keep one bad domain from aborting the whole gather
+            st.warning(f"⚠️ Unexpected error for {domain} ({type(e).__name__}).")
+        return None
+
+
+async def fetch_all(domains):
+    # Batch-only dependencies are deferred so the single-domain path skips them
+    import aiohttp
+    from tenacity import (
+        retry,
+        retry_if_exception_type,
+        stop_after_attempt,
+        wait_exponential,
+    )
+
+    get_json = retry(
+        stop=stop_after_attempt(4),
+        wait=wait_exponential(min=1, max=16),
+        retry=retry_if_exception_type((aiohttp.ClientError, asyncio.TimeoutError)),
+        reraise=True,
+    )(get_domain_json)
+
+    sem = asyncio.Semaphore(MAX_CONCURRENCY)
+    limiter = AdaptiveLimiter(rate_per_minute, 60)
+    connector = aiohttp.TCPConnector(limit_per_host=MAX_CONCURRENCY)
+    timeout = aiohttp.ClientTimeout(total=10)  # Same as the sync session
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        return await asyncio.gather(
+            *[fetch(session, sem, limiter, get_json, d) for d in domains]
+        )
+
+
+def score_domains(domains):
+    # Only dispatch domains that are not already cached
+    cache = get_cache()
+    fetched = {d: cache.get(cache_key(d, api_key)) for d in domains}
+    missing = [d for d, data in fetched.items() if data is None]
+    for domain, data in zip(missing, asyncio.run(fetch_all(missing))):
+        if data is not None:
+            cache.set(cache_key(domain, api_key), data, expire=CACHE_TTL)
+        fetched[domain] = data
+
+    scored = score_batch([fetched[d] for d in domains if fetched[d] is not None])
+    failed = pd.DataFrame([empty_result(d) for d in domains if fetched[d] is None])
+    return pd.concat([scored, failed], ignore_index=True)
+
+
+# ---- CSV Reading ----
+CSV_CHUNK_SIZE = 50_000  # Rows held in memory at once
+
+
+def domain_chunks(f):
+    for chunk in pd.read_csv(
+        f, usecols=["domain"], dtype={"domain": "string"}, chunksize=CSV_CHUNK_SIZE
+    ):
+        yield chunk["domain"].dropna().str.lower().str.strip().unique()
+
+
+# ---- Chart ----
+CHART_COLUMNS = ["domain", "score", "score_group", "industry", "organization"]
+
+
+# top10 must already be sorted by score; the bars keep the data order
+def build_chart(top10):
+    import altair as alt  # Deferred so the single-domain path skips it
+
+    return (
+        alt.Chart(top10)
+        .mark_bar()
+        .encode(
+            x=alt.X("domain:N", sort=None, title="Startup Domain"),
+            y=alt.Y("score:Q", title="Score"),
+            color=alt.Color(
+                "score_group:N",
+                scale=alt.Scale(
+                    domain=["High", "Mid", "Low"],
+                    range=["#2ECC71", "#F1C40F", "#E74C3C"],
+                ),
+                legend=alt.Legend(title="Score Tier"),
+            ),
+            tooltip=["organization", "score", "score_group", "industry"],
+        )
+        .properties(width=700, height=400)
+    )
+
+
+# vl-convert rendering is slow, so reruns on the same top 10 reuse the PNG
+@st.cache_data(show_spinner=False)
+def render_chart_png(top10_records, columns):
+    chart = build_chart(pd.DataFrame(list(top10_records), columns=list(columns)))
+    buf = io.BytesIO()
+    chart.save(buf, format="png")
+    return buf.getvalue()
+
+
 if st.button("Analyze"):
     if not single_domain:
         st.warning("Please enter a domain.")
     else:
         with st.spinner("Looking up domain..."):
-            url = f"https://api.hunter.io/v2/domain-search?domain={single_domain}&api_key={api_key}"
-            response = requests.get(url)
-
-            if response.status_code == 200:
-                data = response.json().get("data", {})
-                result = score_startup(data)
+            try:
+                result = score_domain(single_domain, api_key)
+            except (requests.RequestException, orjson.JSONDecodeError):
+                st.error("❌ Failed to fetch data. Check domain or API usage.")
+            else:
                 st.success(
                     f"✅ {result['organization']} scored **{result['score']}/100**"
                 )
 
                 st.markdown("### 🧾 Details")
                 st.json(result)
-            else:
-                st.error("❌ Failed to fetch data. Check domain or API usage.")
+
+
+# ---- Results Table ----
+PDF_ROWS_PER_TABLE = 500  # Rows per reportlab Table in the PDF report
+
+
+def display_dataframe_quickly(df, max_rows=5000):
+    # Only send a slice of large frames to the browser on each rerun
+    if len(df) <= max_rows:
+        st.dataframe(df, use_container_width=True)
+    else:
+        start = st.slider("Start row", 0, len(df) - max_rows)
+        st.dataframe(df.iloc[start : start + max_rows], use_container_width=True)
 
 
 # ---- File Upload UI ----
@@ -130,104 +441,70 @@ section[data-testid="stSidebar"] > div {
 
 # ---- Process CSV ----
 if uploaded_file:
-    df = pd.read_csv(uploaded_file)
-    if "domain" not in df.columns:
+    columns = pd.read_csv(uploaded_file, nrows=0).columns
+    uploaded_file.seek(0)
+    if "domain" not in columns:
         st.error("CSV must have a 'domain' column.")
     else:
         st.success("✅ File uploaded successfully!")
         results = []
 
         with st.spinner("🔍 Scoring startups..."):
-            for domain in df["domain"]:
-                try:
-                    url = f"https://api.hunter.io/v2/domain-search?domain={domain}&api_key={api_key}"
-                    response = requests.get(url)
-                    if response.status_code == 200:
-                        data = response.json()["data"]
-                        result = score_startup(data)
-                        results.append(result)
-                    else:
-                        results.append(
-                            {
-                                "organization": "N/A",
-                                "domain": domain,
-                                "industry": "N/A",
-                                "emails_found": 0,
-                                "employees": "N/A",
-                                "score": 0,
-                            }
-                        )
-                except:
-                    results.append(
-                        {
-                            "organization": "N/A",
-                            "domain": domain,
-                            "industry": "N/A",
-                            "emails_found": 0,
-                            "employees": "N/A",
-                            "score": 0,
-                        }
-                    )
-                time.sleep(1.1)  # To avoid rate limit (Free API has 30–50 calls/day)
-
-        results_df = pd.DataFrame(results).sort_values(by="score", ascending=False)
+            seen = set()  # Domains repeated across chunks are scored once
+            for domains in domain_chunks(uploaded_file):
+                unique_domains = [d for d in domains if d not in seen]
+                seen.update(unique_domains)
+                results.append(score_domains(unique_domains))
+
+        results_df = pd.concat(results, ignore_index=True).sort_values(
+            by="score", ascending=False
+        )
 
         # ---- Add Score Grouping ----
-        def classify_score(score):
-            if score >= 75:
-                return "High"
-            elif score >= 40:
-                return "Mid"
-            else:
-                return "Low"
-
-        results_df["score_group"] = results_df["score"].apply(classify_score)
-
-        results_df = pd.DataFrame(results).sort_values(by="score", ascending=False)
+        results_df["score_group"] = classify_scores(results_df["score"])
+        results_df["industry"] = results_df["industry"].astype("category")
 
         # ---- Dashboard ----
         st.markdown("### 📈 Top 10 Scoring Startups")
 
-        top10 = results_df.head(10)
-        top10["score_group"] = top10["score"].apply(classify_score)
-        top10["score_group"] = top10["score_group"].astype(str)
-
-        chart = (
-            alt.Chart(top10)
-            .mark_bar()
-            .encode(
-                x=alt.X("domain:N", sort="-y", title="Startup Domain"),
-                y=alt.Y("score:Q", title="Score"),
-                color=alt.Color(
-                    "score_group:N",
-                    scale=alt.Scale(
-                        domain=["High", "Mid", "Low"],
-                        range=["#2ECC71", "#F1C40F", "#E74C3C"],
-                    ),
-                    legend=alt.Legend(title="Score Tier"),
-                ),
-                tooltip=["organization", "score", "score_group", "industry"],
-            )
-            .properties(width=700, height=400)
-        )
+        top10 = results_df.nlargest(10, "score")[CHART_COLUMNS]
+
+        chart = build_chart(top10)
 
         # ---- Save Chart as PNG (Now works with vl-convert-python) ----
-        chart_filename = "score_chart.png"
         try:
-            chart.save(chart_filename)
+            chart_png = render_chart_png(
+                tuple(top10.itertuples(index=False, name=None)),
+                tuple(top10.columns),
+            )
         except Exception as e:
             st.error(f"❌ Failed to save chart: {e}")
-            chart_filename = None
+            chart_png = None
 
         # ---- Show Table in App
         st.markdown("### 📋 Full Results Table")
-        st.dataframe(results_df, use_container_width=True)
+        display_dataframe_quickly(results_df)
 
         # ---- Show chart on Streamlit
         st.altair_chart(chart, use_container_width=True)
 
         # ---- Generate PDF with Chart and Table ----
-        def generate_pdf_with_chart(df, chart_path):
+        def generate_pdf_with_chart(df, chart_png):
+            # Deferred so reportlab only loads when a report is built
+            import datetime
+
+            from reportlab.platypus import (
+                SimpleDocTemplate,
+                Table,
+                TableStyle,
+                Paragraph,
+                Spacer,
+                Image,
+            )
+            from reportlab.lib import colors
+            from reportlab.lib.pagesizes import letter
+            from reportlab.lib.styles import getSampleStyleSheet
+
             buffer = io.BytesIO()
             doc = SimpleDocTemplate(buffer, pagesize=letter)
             elements = []
@@ -238,26 +515,31 @@ if uploaded_file:
             elements.append(Paragraph(f"Generated on {date_str}", styles["Normal"]))
             elements.append(Spacer(1, 12))
 
-            if chart_path and os.path.exists(chart_path):
-                elements.append(Image(chart_path, width=500, height=300))
+            if chart_png:
+                elements.append(Image(io.BytesIO(chart_png), width=500, height=300))
                 elements.append(Spacer(1, 20))
 
-            data = [df.columns.tolist()] + df.values.tolist()
-            table = Table(data, repeatRows=1)
-            table.setStyle(
-                TableStyle(
-                    [
-                        ("BACKGROUND", (0, 0), (-1, 0), colors.HexColor("#f2f2f2")),
-                        ("TEXTCOLOR", (0, 0), (-1, 0), colors.black),
-                        ("ALIGN", (0, 0), (-1, -1), "LEFT"),
-                        ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
-                        ("FONTSIZE", (0, 0), (-1, 0), 10),
-                        ("BOTTOMPADDING", (0, 0), (-1, 0), 8),
-                        ("GRID", (0, 0), (-1, -1), 0.25, colors.grey),
-                    ]
-                )
+            table_style = TableStyle(
+                [
+                    ("BACKGROUND", (0, 0), (-1, 0), colors.HexColor("#f2f2f2")),
+                    ("TEXTCOLOR", (0, 0), (-1, 0), colors.black),
+                    ("ALIGN", (0, 0), (-1, -1), "LEFT"),
+                    ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
+                    ("FONTSIZE", (0, 0), (-1, 0), 10),
+                    ("BOTTOMPADDING", (0, 0), (-1, 0), 8),
+                    ("GRID", (0, 0), (-1, -1), 0.25, colors.grey),
+                ]
             )
-            elements.append(table)
+
+            # Rows are built per PDF_ROWS_PER_TABLE slice rather than via
+            # df.values.tolist(); each table still splits across pages itself
+            header = df.columns.tolist()
+            for start in range(0, max(len(df), 1), PDF_ROWS_PER_TABLE):
+                rows = df.iloc[start : start + PDF_ROWS_PER_TABLE].astype(str)
+                data = [header, *map(list, rows.itertuples(index=False, name=None))]
+                table = Table(data, repeatRows=1)
+                table.setStyle(table_style)
+                elements.append(table)
 
             doc.build(elements)
             pdf = buffer.getvalue()
@@ -265,7 +547,7 @@ if uploaded_file:
             return pdf
 
         # ---- Download Button for PDF ----
-        pdf_bytes = generate_pdf_with_chart(results_df, chart_filename)
+        pdf_bytes = generate_pdf_with_chart(results_df, chart_png)
 
         st.download_button(
             label="📄 Download Full Report as PDF",